@@ -0,0 +1,103 @@
+"""
+nvidia-smi CSV 快速解析：把一帧输出直接写入预分配的 int32 数组。
+装了 numba 时用 JIT 编译的逐字节扫描，不产生任何中间对象；
+没装则走 bytes.split + int() 的纯 Python 版本（逐字节扫描在解释器里反而更慢）。
+两个版本对同样的输入结果一致。
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+MAX_GPUS = 64             # 单台服务器最多解析的卡数，超出的行丢弃
+NUM_FIELDS = 5            # index, util, mem_used, mem_total, temp
+MAX_DIGITS = 9            # 单个字段最多几位数字，更长的行视为格式错误，避免 int32 溢出
+
+def alloc_buffers(capacity=MAX_GPUS):
+    """为一台服务器分配可反复使用的解析缓冲区：每列一个 int32 数组"""
+    return tuple(np.empty(capacity, dtype=np.int32) for _ in range(NUM_FIELDS))
+
+def _scan_csv(buf, out_id, out_util, out_mu, out_mt, out_t):
+    """
+    numba 版本：buf 为 uint8 数组，逐字节累加数字，遇到 ',' / '\\n' 收尾一个字段。
+    空白只允许出现在数字前后，数字中间夹空白（如 "1 2"）整行作废。
+    """
+    cap = out_util.shape[0]
+    size = buf.shape[0]
+    vals = np.zeros(NUM_FIELDS, dtype=np.int64)
+    n = 0
+    field = 0
+    val = 0
+    digits = 0
+    trailing = False          # 当前字段的数字后面已经出现过空白
+    bad = False
+
+    # 多扫一个位置，当作末尾补了换行，最后一行没有 \n 也能收尾
+    for i in range(size + 1):
+        c = int(buf[i]) if i < size else 10
+        if 48 <= c <= 57:                  # '0'..'9'
+            if trailing:
+                bad = True
+            val = val * 10 + (c - 48)
+            digits += 1
+        elif c == 44 or c == 10:           # ',' 或 '\n'：一个字段结束
+            if field < NUM_FIELDS:
+                if 0 < digits <= MAX_DIGITS:
+                    vals[field] = val
+                else:
+                    bad = True
+            field += 1
+            val = 0
+            digits = 0
+            trailing = False
+            if c == 10:
+                if field == NUM_FIELDS and not bad and n < cap:
+                    out_id[n] = vals[0]
+                    out_util[n] = vals[1]
+                    out_mu[n] = vals[2]
+                    out_mt[n] = vals[3]
+                    out_t[n] = vals[4]
+                    n += 1
+                field = 0
+                bad = False
+        elif c == 32 or c == 9 or c == 13:  # 空格 / tab / \r
+            if digits > 0:
+                trailing = True
+        else:
+            bad = True
+    return n
+
+def _split_csv(raw, out_id, out_util, out_mu, out_mt, out_t):
+    """纯 Python 版本：按行、按逗号切开后直接对 bytes 调 int()"""
+    cap = out_util.shape[0]
+    n = 0
+    for line in raw.split(b"\n"):
+        if n >= cap:
+            break
+        parts = line.split(b",")
+        if len(parts) != NUM_FIELDS:
+            continue
+        # 与 numba 版本保持一致：前后空白之外只能是 1..MAX_DIGITS 位数字，
+        # int() 本身能接受的 "+1"、"1_0"、"-1" 等都不算
+        parts = [x.strip(b" \t\r") for x in parts]
+        if not all(x.isdigit() and len(x) <= MAX_DIGITS for x in parts):
+            continue
+        vals = [int(x) for x in parts]
+        out_id[n], out_util[n], out_mu[n], out_mt[n], out_t[n] = vals
+        n += 1
+    return n
+
+if njit is not None:
+    _scan_csv = njit(cache=True)(_scan_csv)
+
+def parse_csv(raw, out_id, out_util, out_mu, out_mt, out_t):
+    """
+    raw: 一帧原始输出（bytes），每行 "index, util, mem_used, mem_total, temp"。
+    逐行写入 out_* 数组，返回解析成功的行数；
+    字段数不对、含非数字字符（如 [N/A]）或数字过长的行跳过。
+    """
+    if njit is not None:
+        return _scan_csv(np.frombuffer(raw, dtype=np.uint8), out_id, out_util, out_mu, out_mt, out_t)
+    return _split_csv(raw, out_id, out_util, out_mu, out_mt, out_t)
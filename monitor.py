@@ -1,6 +1,14 @@
 import asyncio
-import shutil
-from datetime import datetime
+import math
+import re
+import shlex
+import socket
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+import asyncssh
+import numpy as np
 from rich.console import Console
 from rich.live import Live
 from rich.table import Table
@@ -9,125 +17,466 @@ from rich.layout import Layout
 from rich.text import Text
 from rich.progress import BarColumn, Progress, TextColumn
 from rich.box import SIMPLE
+from gpu_parser import alloc_buffers, parse_csv
+
+# 可选：uvloop 的子进程/socket 调度开销比默认事件循环小，没装就用默认的
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# 可选：aiohttp 用于从 dcgm-exporter 拉取指标，没装则只走 SSH
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 
 # --- 高级配置 ---
 SERVERS = ["server2", "server3", "server4", "server5"]
 REFRESH_RATE = 3          # 刷新间隔（秒）
+RENDER_INTERVAL = 0.25    # 两次重绘的最小间隔（秒），短时间内多台服务器的更新合并成一次
 SSH_TIMEOUT = 20          # SSH 连接超时时间 (第一次连接可能较慢)
-MAX_RETRIES = 1           # 失败重试次数
+SSH_KEEPALIVE = 30        # SSH 保活间隔（秒）
+SSH_KEEPALIVE_MAX = 3     # 连续几次保活无响应判定断线
+# 熔断：每次失败后暂停 2**failures 秒不再连接该服务器，到期后再试（半开探测）
+BREAKER_MAX_OPEN = 300    # 暂停时长上限（秒）
+BREAKER_THRESHOLD = 3     # 连续失败达到该次数后，探测改用 PROBE_TIMEOUT，死机不再每次卡满 SSH_TIMEOUT；
+                          # 之后每 BREAKER_THRESHOLD 次仍用完整的 SSH_TIMEOUT 试一次，登录慢的服务器也能恢复
+PROBE_TIMEOUT = 3         # 探测连接超时（秒）
+FRAME_GAP = 0.5           # 还不知道卡数时，流静默这么久（秒）就认为第一帧已经输出完
 
-# SSH 参数优化：
-# 1. ControlMaster/Persist: 开启连接复用，第一次慢，后面秒开
-# 2. UserKnownHostsFile=/dev/null: 忽略指纹验证，防止卡死
-# 3. LogLevel=ERROR: 减少干扰
-SSH_OPTS = f"-o ConnectTimeout={SSH_TIMEOUT} -o BatchMode=yes -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o LogLevel=ERROR -o GSSAPIAuthentication=no -o ControlMaster=auto -o ControlPath=/tmp/ssh_mux_%h_%p_%r -o ControlPersist=600"
+# SSH 长连接：
+# 1. 每台服务器一条 asyncssh 连接，上面只开一个 channel 持续运行 nvidia-smi -lms，不再每轮重新执行
+# 2. known_hosts=None: 忽略指纹验证，防止卡死
+# 3. 地址/端口/用户/密钥沿用 ~/.ssh/config
+# 4. 关闭 GSSAPI 和压缩，优先用握手/加解密都便宜的 AEAD 算法（aes128-ctr 兜底老服务器）
+SSH_CIPHERS = ["chacha20-poly1305@openssh.com", "aes128-gcm@openssh.com", "aes128-ctr"]
+SSH_MACS = ["hmac-sha2-256-etm@openssh.com", "hmac-sha2-256"]
 GPU_CMD = "nvidia-smi --query-gpu=index,utilization.gpu,memory.used,memory.total,temperature.gpu --format=csv,noheader,nounits"
+STREAM_CMD = f"{GPU_CMD} -lms {REFRESH_RATE * 1000}"
+
+# 跳板机模式：服务器都在同一台登录节点后面时，填它在 ~/.ssh/config 中的别名，
+# 每轮只在跳板机上跑一次 parallel-ssh 批量拉取所有服务器（服务器别名需在跳板机上可解析）；
+# None 表示直连每台服务器
+GATEWAY = None
+PSSH_BIN = "parallel-ssh"  # 部分发行版叫 pssh
+_PSSH_ARGV = ["-O", "StrictHostKeyChecking=no", "-i", "-t", str(SSH_TIMEOUT)]
+
+# DCGM 模式：服务器上跑着 dcgm-exporter 时，填它的 metrics 地址（需安装 aiohttp），
+# 每轮一次 keep-alive 的 HTTP GET，不用经 SSH 启动 nvidia-smi；拉取失败时回退到 SSH。
+# 不在表里的服务器直接走 SSH；跳板机模式下不生效
+DCGM_URL = {}             # 例如 {"server2": "http://server2:9400/metrics"}
+
+# 颜色阈值：低于第一个阈值取第一个颜色，依此类推
+USAGE_THRESHOLDS = [30, 80]
+USAGE_COLORS = ("green", "yellow", "red")
+TEMP_THRESHOLDS = [60, 80]
+TEMP_COLORS = ("green", "yellow", "red bold blink")
+
+# 一帧数据按列存（SoA）：每列一个 int32 数组，字段顺序与 --query-gpu 一致
+# 显存单位 MiB，80G 卡超过 uint16 上限，所以统一用 int32
+GPUFrame = namedtuple("GPUFrame", "ids util mem_used mem_total temp")
+EMPTY_FRAME = GPUFrame(*(np.empty(0, dtype=np.int32) for _ in range(5)))
 
 # 初始化状态为 "init"
-SERVER_STATE = {s: {"status": "init", "data": [], "last_error": ""} for s in SERVERS}
+# next_refresh: 下次拉取时间；failures / open_until: 熔断计数与暂停截止时间；跨状态保留
+SERVER_STATE = {
+    s: {"status": "init", "data": EMPTY_FRAME, "last_error": "", "next_refresh": 0.0, "failures": 0, "open_until": 0.0}
+    for s in SERVERS
+}
+
+# host -> asyncssh.SSHClientConnection，断线后移除，下一轮自动重连
+CONNS = {}
+
+# 面板上显示的更新时间：由 _ts_ticker 每秒刷新一次，所有服务器共用，不必每帧各自格式化
+_CURRENT_TS = time.strftime("%H:%M:%S")
+
+# DCGM_URL 非空且装了 aiohttp 时，在 run() 里创建的共享 HTTP 会话
+_HTTP_SESSION = None
+
+# 任一服务器显示内容变化时由抓取线程置位，主线程的 render_loop 等它再重绘
+_STATE_CHANGED = threading.Event()
+
+# host -> (状态 key, Panel)，状态没变时跳过重建
+_PANEL_CACHE = {}
+
+# host -> gpu_parser 解析缓冲区，每台服务器分配一次，之后每帧复用
+_PARSE_BUFFERS = {}
 
 console = Console()
 
-async def fetch_single_server_with_retry(host):
-    """带重试机制的获取逻辑"""
-    for attempt in range(MAX_RETRIES + 1):
-        success = await _fetch_core(host)
-        if success:
-            return
-        if attempt < MAX_RETRIES:
-            await asyncio.sleep(1)
+async def _connect(host, timeout=SSH_TIMEOUT):
+    """建立到 host 的长连接并缓存"""
+    conn = await asyncio.wait_for(
+        asyncssh.connect(
+            host,
+            known_hosts=None,
+            keepalive_interval=SSH_KEEPALIVE,
+            keepalive_count_max=SSH_KEEPALIVE_MAX,
+            gss_auth=False,
+            gss_kex=False,
+            encryption_algs=SSH_CIPHERS,
+            mac_algs=SSH_MACS,
+            compression_algs=["none"]
+        ),
+        timeout=timeout
+    )
+    # 不用再手动设 TCP_NODELAY：asyncssh 建连时已对 TCP socket 关掉 Nagle，tcp_keepalive 也默认开启
+    CONNS[host] = conn
+    return conn
+
+def _drop_conn(host):
+    """丢弃失效连接"""
+    conn = CONNS.pop(host, None)
+    if conn is not None:
+        conn.abort()
+
+def close_all():
+    for host in list(CONNS):
+        CONNS.pop(host).close()
+
+def _parse_frame(host, raw):
+    """
+    把一帧原始输出（bytes）解析成 GPUFrame，格式不对的行跳过。
+    解析缓冲区按服务器复用；发布出去的是切片拷贝，不会被下一帧覆盖。
+    """
+    bufs = _PARSE_BUFFERS.get(host)
+    if bufs is None:
+        bufs = _PARSE_BUFFERS[host] = alloc_buffers()
+    n = parse_csv(raw, *bufs)
+    if n == 0:
+        return EMPTY_FRAME
+    return GPUFrame(*(col[:n].copy() for col in bufs))
+
+def _notify_changed():
+    _STATE_CHANGED.set()
+
+def _frame_changed(old, new):
+    return any(not np.array_equal(a, b) for a, b in zip(old, new))
+
+def _set_ok(host, gpus):
+    prev = SERVER_STATE[host]
+    changed = prev["status"] != "ok" or _frame_changed(prev["data"], gpus)
+    SERVER_STATE[host] = {
+        "status": "ok",
+        "data": gpus,
+        "timestamp": _CURRENT_TS,
+        "last_error": "",
+        "next_refresh": time.monotonic() + REFRESH_RATE,
+        "failures": 0,
+        "open_until": 0.0
+    }
+    # 先写入再通知：渲染在另一个线程，反过来可能读到旧状态后把事件清掉
+    if changed:
+        _notify_changed()
+
+def _set_error(host, last_error):
+    prev = SERVER_STATE[host]
+    failures = prev.get("failures", 0) + 1
+    # 指数封顶，避免 2 ** n 无限增长
+    open_until = time.monotonic() + min(BREAKER_MAX_OPEN, 2 ** min(failures, 10))
+    changed = prev["status"] != "error" or prev["last_error"] != last_error
+    SERVER_STATE[host] = {
+        "status": "error",
+        "data": EMPTY_FRAME,
+        "timestamp": _CURRENT_TS,
+        "last_error": last_error,
+        "next_refresh": open_until,
+        "failures": failures,
+        "open_until": open_until
+    }
+    if changed:
+        _notify_changed()
+
+async def stream_host(host):
+    """每台服务器一个后台任务：流断开后熔断到 open_until 再重连，期间面板保留上次的错误信息"""
+    while True:
+        # 有 DCGM 就优先用，一开始就拉不到才回退到 SSH
+        if not await _poll_dcgm(host):
+            await _fetch_core(host)
+        delay = SERVER_STATE[host]["open_until"] - time.monotonic()
+        await asyncio.sleep(max(delay, 0))
 
 async def _fetch_core(host):
-    """核心获取逻辑"""
+    """
+    核心获取逻辑：在一个 channel 上持续读取 nvidia-smi -lms 的输出，直到流中断。
+    nvidia-smi 两帧之间没有分隔行，按 index 回到 0 判断新一帧开始，
+    第一帧之后记下卡数，之后凑满即刷新，不用等下一帧。
+    第一帧时还不知道卡数：流静默 FRAME_GAP 秒即视为输出完，不必等一个周期后下一帧的 "0," 行。
+    """
     try:
-        full_cmd = f"ssh {SSH_OPTS} {host} '{GPU_CMD}'"
-        
-        process = await asyncio.create_subprocess_shell(
-            full_cmd,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
-        )
-        
-        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=SSH_TIMEOUT + 2)
-
-        if process.returncode == 0:
-            raw_data = stdout.decode().strip()
-            parsed_gpus = []
-            if raw_data:
-                for line in raw_data.split('\n'):
+        conn = CONNS.get(host)
+        if conn is None:
+            # 连续失败多次的服务器大多只做快速探测，隔几次再完整等一次握手
+            failures = SERVER_STATE[host]["failures"]
+            probing = failures >= BREAKER_THRESHOLD and failures % BREAKER_THRESHOLD != 0
+            conn = await _connect(host, PROBE_TIMEOUT if probing else SSH_TIMEOUT)
+
+        # encoding=None：直接按 bytes 读，交给 gpu_parser 解析，省掉一次整帧 decode/encode
+        async with conn.create_process(STREAM_CMD, encoding=None) as process:
+            frame = []
+            gpu_count = 0
+            while True:
+                if frame and not gpu_count:
                     try:
-                        parts = [x.strip() for x in line.split(',')]
-                        if len(parts) == 5:
-                            parsed_gpus.append({
-                                "id": parts[0],
-                                "util": int(parts[1]),
-                                "mem_used": int(parts[2]),
-                                "mem_total": int(parts[3]),
-                                "temp": int(parts[4])
-                            })
-                    except ValueError:
-                        continue 
-            
-            SERVER_STATE[host] = {
-                "status": "ok",
-                "data": parsed_gpus,
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                "last_error": ""
-            }
-            return True
-        else:
-            error_msg = stderr.decode().strip()
-            short_err = error_msg.split('\n')[-1] if error_msg else f"Exit Code {process.returncode}"
-            
-            SERVER_STATE[host] = {
-                "status": "error",
-                "data": [],
-                "timestamp": datetime.now().strftime("%H:%M:%S"),
-                "last_error": short_err 
-            }
-            return False
-            
-    except asyncio.TimeoutError:
-        SERVER_STATE[host] = {
-            "status": "error", 
-            "data": [],
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
-            "last_error": "❌ SSH Timed Out (Network/Firewall?)"
-        }
-        return False
+                        line = await asyncio.wait_for(process.stdout.readline(), timeout=FRAME_GAP)
+                    except asyncio.TimeoutError:
+                        gpu_count = len(frame)
+                        _set_ok(host, _parse_frame(host, b"".join(frame)))
+                        frame = []
+                        continue
+                else:
+                    # SSH_TIMEOUT + REFRESH_RATE 秒内没有任何新数据，视为连接卡死
+                    line = await asyncio.wait_for(process.stdout.readline(), timeout=SSH_TIMEOUT + REFRESH_RATE)
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                # 先攒原始行，凑满一帧再整体解析
+                if frame and line.startswith(b"0,"):
+                    gpu_count = len(frame)
+                    _set_ok(host, _parse_frame(host, b"".join(frame)))
+                    frame = []
+                frame.append(line)
+                if len(frame) == gpu_count:
+                    _set_ok(host, _parse_frame(host, b"".join(frame)))
+                    frame = []
+
+            # 远端进程退出（如 nvidia-smi 不存在 / 驱动异常）
+            result = await process.wait()
+            _set_error(host, _short_error(result.stderr, result.exit_status))
+
     except Exception as e:
-        SERVER_STATE[host] = {
-            "status": "error", 
-            "data": [],
-            "timestamp": datetime.now().strftime("%H:%M:%S"),
-            "last_error": f"Exception: {str(e)}"
-        }
+        _set_error(host, _describe_error(host, e))
+
+# dcgm-exporter 的一行指标，如 'DCGM_FI_DEV_GPU_UTIL{gpu="0",UUID="..."} 37'
+_DCGM_LINE = re.compile(r'^(DCGM_FI_DEV_\w+)\{([^}]*)\} (\S+)', re.M)
+_DCGM_LABEL = re.compile(r'(\w+)="([^"]*)"')
+# 指标名 -> 统计表里的列；显存总量由 FB_USED + FB_FREE (+ FB_RESERVED) 得出
+_DCGM_FIELDS = {
+    "DCGM_FI_DEV_GPU_UTIL": "util",
+    "DCGM_FI_DEV_FB_USED": "used",
+    "DCGM_FI_DEV_FB_FREE": "free",
+    "DCGM_FI_DEV_FB_RESERVED": "reserved",
+    "DCGM_FI_DEV_GPU_TEMP": "temp"
+}
+
+_INT32_MAX = int(np.iinfo(np.int32).max)
+
+def _parse_dcgm(text):
+    """
+    把 Prometheus 文本格式的 dcgm-exporter 输出解析成 GPUFrame。
+    开了 MIG 时同一个 gpu="N" 下每个实例各有一组指标（带 GPU_I_ID），按 (gpu, GPU_I_ID) 分开成行，
+    ID 列显示所属的卡号；实例行缺的指标（如只在整卡上报的温度）取整卡那一行的值。
+    NaN / ±Inf / 负数 / 超出 int32 的采样值直接跳过，当作没有上报。
+    """
+    rows = {}
+    for name, labels, value in _DCGM_LINE.findall(text):
+        field = _DCGM_FIELDS.get(name)
+        if field is None:
+            continue
+        labels = dict(_DCGM_LABEL.findall(labels))
+        gpu = labels.get("gpu", "")
+        if not gpu.isdigit():
+            continue
+        instance = labels.get("GPU_I_ID", "")
+        try:
+            value = float(value)
+        except ValueError:
+            continue
+        if not math.isfinite(value) or not 0 <= value <= _INT32_MAX:
+            continue
+        key = (int(gpu), int(instance) if instance.isdigit() else -1)
+        rows.setdefault(key, {})[field] = int(value)
+    if not rows:
+        return EMPTY_FRAME
+
+    # 有实例行的卡，整卡那一行只用来补缺失的指标，不单独显示
+    mig_gpus = {gpu for gpu, instance in rows if instance >= 0}
+    keys = sorted(k for k in rows if k[1] >= 0 or k[0] not in mig_gpus)
+    merged = [{**rows.get((gpu, -1), {}), **rows[(gpu, instance)]} for gpu, instance in keys]
+
+    return GPUFrame(
+        np.array([gpu for gpu, _ in keys], dtype=np.int32),
+        np.array([r.get("util", 0) for r in merged], dtype=np.int32),
+        np.array([r.get("used", 0) for r in merged], dtype=np.int32),
+        np.array([min(r.get("used", 0) + r.get("free", 0) + r.get("reserved", 0), _INT32_MAX) for r in merged], dtype=np.int32),
+        np.array([r.get("temp", 0) for r in merged], dtype=np.int32)
+    )
+
+async def _poll_dcgm(host):
+    """
+    按 REFRESH_RATE 轮询 host 的 dcgm-exporter，直到出错。
+    没配置 / 第一次就拉不到返回 False，由调用方回退到 SSH；拉到过数据后再出错记为错误，返回 True。
+    """
+    url = DCGM_URL.get(host)
+    if url is None or _HTTP_SESSION is None:
         return False
 
+    fetched = False
+    while True:
+        # 解析也放在 try 里：一台服务器的异常输出只影响它自己，不能让整个面板退出
+        try:
+            async with _HTTP_SESSION.get(url) as r:
+                r.raise_for_status()
+                text = await r.text()
+            frame = _parse_dcgm(text)
+        except Exception as e:
+            if fetched:
+                _set_error(host, f"DCGM error: {e}")
+            return fetched
+
+        if frame is EMPTY_FRAME and not fetched:
+            return False
+        fetched = True
+        _set_ok(host, frame)
+        await asyncio.sleep(REFRESH_RATE)
+
+def _short_error(stderr, exit_status):
+    """取 stderr（bytes）最后一行作为错误信息，没有输出则显示退出码"""
+    error_msg = (stderr or b"").decode(errors="replace").strip()
+    return error_msg.split('\n')[-1] if error_msg else f"Exit Code {exit_status}"
+
+def _describe_error(host, e):
+    """把异常转成面板上的错误信息；连接层面的异常顺带丢弃缓存连接，下一轮重连"""
+    if isinstance(e, asyncio.TimeoutError):
+        _drop_conn(host)
+        return "❌ SSH Timed Out (Network/Firewall?)"
+    if isinstance(e, (asyncssh.DisconnectError, asyncssh.ChannelOpenError)):
+        _drop_conn(host)
+        return f"SSH error: {e.reason}"
+    if isinstance(e, ConnectionRefusedError):
+        return "Connection refused"
+    if isinstance(e, socket.gaierror):
+        return f"Could not resolve hostname {host}"
+    return f"Exception: {str(e)}"
+
+# parallel-ssh -i 每台机器输出前的标题行，如 "[1] 12:00:00 [SUCCESS] server2"
+_PSSH_HEADER = re.compile(rb"^\[\d+\] \S+ \[(SUCCESS|FAILURE)\] (\S+) ?(.*)$")
+
+def _parse_pssh_output(raw):
+    """把 parallel-ssh -i 的输出（bytes）按标题行切开：host -> (是否成功, stdout 行, 失败原因)"""
+    results = {}
+    current = None
+    for line in raw.splitlines():
+        m = _PSSH_HEADER.match(line)
+        if m:
+            current = {"ok": m.group(1) == b"SUCCESS", "lines": [], "stderr": [], "reason": m.group(3)}
+            results[m.group(2).decode()] = current
+        elif current is not None:
+            # stderr 紧跟在 stdout 之后，以 "Stderr: " 开头
+            if current["stderr"]:
+                current["stderr"].append(line)
+            elif line.startswith(b"Stderr: "):
+                current["stderr"].append(line[len(b"Stderr: "):])
+            else:
+                current["lines"].append(line)
+
+    parsed = {}
+    for host, r in results.items():
+        stderr = [x for x in r["stderr"] if x.strip()]
+        reason = stderr[-1].strip() if stderr else (r["reason"] or b"Failed")
+        parsed[host] = (r["ok"], r["lines"], reason.decode(errors="replace"))
+    return parsed
+
+async def fetch_cluster():
+    """跳板机模式的后台任务：只拉 next_refresh 已到期的服务器，一轮一次 SSH 往返"""
+    while True:
+        now = time.monotonic()
+        due = [h for h in SERVERS if now >= SERVER_STATE[h]["next_refresh"]]
+        if due:
+            await _fetch_cluster_core(due)
+        delay = min(SERVER_STATE[h]["next_refresh"] for h in SERVERS) - time.monotonic()
+        await asyncio.sleep(max(delay, 0))
+
+async def _fetch_cluster_core(hosts):
+    try:
+        conn = CONNS.get(GATEWAY)
+        if conn is None:
+            conn = await _connect(GATEWAY)
+
+        # 逐个参数转义，主机名/命令里有引号或空格也不会被远端 shell 拆错
+        cmd = shlex.join([PSSH_BIN, *_PSSH_ARGV, "-H", " ".join(hosts), GPU_CMD])
+        result = await asyncio.wait_for(conn.run(cmd, check=False, encoding=None), timeout=SSH_TIMEOUT + REFRESH_RATE)
+        outputs = _parse_pssh_output(result.stdout or b"")
+
+        if not outputs:
+            # parallel-ssh 自己没跑起来（如未安装）
+            short_err = _short_error(result.stderr, result.exit_status)
+            for host in hosts:
+                _set_error(host, f"{GATEWAY}: {short_err}")
+            return
+
+        for host in hosts:
+            if host not in outputs:
+                _set_error(host, f"No output from {GATEWAY}")
+                continue
+            ok, lines, reason = outputs[host]
+            if ok:
+                _set_ok(host, _parse_frame(host, b"\n".join(lines)))
+            else:
+                _set_error(host, reason)
+
+    except Exception as e:
+        msg = _describe_error(GATEWAY, e)
+        for host in hosts:
+            _set_error(host, msg)
+
 def get_color_usage(percent):
-    if percent < 30: return "green"
-    if percent < 80: return "yellow"
-    return "red"
+    return USAGE_COLORS[bisect_right(USAGE_THRESHOLDS, percent)]
 
 def get_color_temp(temp):
-    if temp < 60: return "green"
-    if temp < 80: return "yellow"
-    return "red bold blink"
+    return TEMP_COLORS[bisect_right(TEMP_THRESHOLDS, temp)]
 
-def create_bar(percent, width=10):
+def _build_bar(percent, width):
     color = get_color_usage(percent)
     blocks = int((percent / 100) * width)
     bar_str = "█" * blocks + "░" * (width - blocks)
     return f"[{color}]{bar_str}[/{color}]"
 
+def _build_temp(temp):
+    return f"[{get_color_temp(temp)}]{temp}°C[/]"
+
+# 预先渲染好的进度条 / 温度字符串，按整数百分比 / 摄氏度直接查表
+_BAR_LUT = {width: [_build_bar(p, width) for p in range(101)] for width in (8, 10)}
+_TEMP_STYLED = [_build_temp(t) for t in range(120)]
+
+def create_bar(percent, width=10):
+    lut = _BAR_LUT.get(width)
+    if lut is None:
+        return _build_bar(percent, width)
+    return lut[max(0, min(100, int(percent)))]
+
+def format_temp(temp):
+    if 0 <= temp < len(_TEMP_STYLED):
+        return _TEMP_STYLED[temp]
+    return _build_temp(temp)
+
+def _panel_key(state):
+    """面板内容只取决于这些字段，相同则可以直接复用上次的 Panel"""
+    frame = state.get("data", EMPTY_FRAME)
+    gpus = tuple(col.tobytes() for col in frame)
+    return (state.get("status", "init"), state.get("timestamp", ""), state.get("last_error", ""), gpus)
+
 def render_server_panel(host):
+    """带缓存的面板渲染：状态没变就返回上次构建的 Panel"""
+    state = SERVER_STATE.get(host, {})
+    key = _panel_key(state)
+    cached = _PANEL_CACHE.get(host)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    panel = _build_server_panel(host, state)
+    _PANEL_CACHE[host] = (key, panel)
+    return panel
+
+def _build_server_panel(host, state):
     """
     渲染面板逻辑：
     1. init -> 蓝色连接中
     2. error -> 红色报错
     3. ok -> 绿色数据
     """
-    state = SERVER_STATE.get(host, {})
     status = state.get("status", "init")
     
     # --- 1. 初始化/连接中状态 (新增逻辑) ---
@@ -160,7 +509,7 @@ def render_server_panel(host):
         )
 
     # --- 3. 正常数据状态 ---
-    gpus = state.get("data", [])
+    frame = state.get("data", EMPTY_FRAME)
     timestamp = state.get("timestamp", "")
     
     table = Table(show_header=True, header_style="bold white", box=SIMPLE, expand=True, padding=(0,1))
@@ -169,16 +518,19 @@ def render_server_panel(host):
     table.add_column("Mem %", justify="left", ratio=3)
     table.add_column("Temp", justify="right", width=4)
 
-    for gpu in gpus:
-        mem_pct = (gpu['mem_used'] / gpu['mem_total']) * 100 if gpu['mem_total'] > 0 else 0
-        util_bar = create_bar(gpu['util'], width=8)
-        mem_bar = create_bar(mem_pct, width=8)
-        temp_styled = f"[{get_color_temp(gpu['temp'])}]{gpu['temp']}°C[/]"
-        
+    # 整列算出整数百分比，颜色已经包含在查表结果里，循环只负责拼字符串
+    mem_pct = (frame.mem_used * 100) // np.maximum(frame.mem_total, 1)
+
+    rows = zip(frame.ids.tolist(), frame.util.tolist(), mem_pct.tolist(), frame.temp.tolist())
+    for gpu_id, util, mem, temp in rows:
+        util_bar = create_bar(util, width=8)
+        mem_bar = create_bar(mem, width=8)
+        temp_styled = format_temp(temp)
+
         table.add_row(
-            str(gpu['id']),
-            f"{util_bar} {gpu['util']}%",
-            f"{mem_bar} {int(mem_pct)}%",
+            str(gpu_id),
+            f"{util_bar} {util}%",
+            f"{mem_bar} {mem}%",
             temp_styled
         )
 
@@ -189,50 +541,118 @@ def render_server_panel(host):
         expand=True
     )
 
+# 外层两列布局只建一次，之后每次只替换格子里的 Panel
+_GRID = Table.grid(expand=True, padding=1)
+_GRID.add_column(ratio=1)
+_GRID.add_column(ratio=1)
+_EMPTY_PANEL = Panel("", border_style="black") # 占位空面板
+
+def _init_grid():
+    """按服务器数量建好行，每行两格，启动时调用一次"""
+    for _ in range(0, len(SERVERS), 2):
+        _GRID.add_row(_EMPTY_PANEL, _EMPTY_PANEL)
+
 def generate_dashboard():
-    grid = Table.grid(expand=True, padding=1)
-    grid.add_column(ratio=1)
-    grid.add_column(ratio=1)
-    
-    # 这里动态生成行，防止手动写死 index out of range
+    left = _GRID.columns[0]._cells
+    right = _GRID.columns[1]._cells
+
+    # 这里动态计算行，防止手动写死 index out of range；奇数台时最后一格保持占位
     num_servers = len(SERVERS)
     for i in range(0, num_servers, 2):
-        s1 = SERVERS[i]
-        s2 = SERVERS[i+1] if (i+1) < num_servers else None
-        
-        p1 = render_server_panel(s1)
-        p2 = render_server_panel(s2) if s2 else Panel("", border_style="black") # 占位空面板
-        
-        grid.add_row(p1, p2)
-    
-    return grid
+        row = i // 2
+        left[row] = render_server_panel(SERVERS[i])
+        if (i+1) < num_servers:
+            right[row] = render_server_panel(SERVERS[i+1])
+
+    return _GRID
+
+def _compile_dashboard():
+    """
+    SERVERS 启动后不再变化：生成一个展开循环的 generate_dashboard 替换上面的通用版本，
+    主机名和格子位置都写成常量，每次渲染省掉循环和下标计算。在 _init_grid() 之后调用。
+    """
+    src = [
+        "def generate_dashboard(left=_GRID.columns[0]._cells, right=_GRID.columns[1]._cells):"
+    ]
+    for i, host in enumerate(SERVERS):
+        cells = "left" if i % 2 == 0 else "right"
+        src.append(f"    {cells}[{i // 2}] = render_server_panel({host!r})")
+    src.append("    return _GRID")
+    exec("\n".join(src), globals())
 
-async def update_loop(live):
+async def _ts_ticker():
+    global _CURRENT_TS
     while True:
-        # 并发获取所有数据
-        # 注意：这里会改变 SERVER_STATE 里的 status
-        tasks = [fetch_single_server_with_retry(s) for s in SERVERS]
+        _CURRENT_TS = time.strftime("%H:%M:%S")
+        await asyncio.sleep(1)
+
+async def run():
+    global _HTTP_SESSION
+    if DCGM_URL and aiohttp is not None:
+        _HTTP_SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=600),
+            timeout=aiohttp.ClientTimeout(total=SSH_TIMEOUT)
+        )
+
+    # 每台服务器一个后台任务持续写 SERVER_STATE；跳板机模式下只有一个批量任务
+    if GATEWAY:
+        tasks = [asyncio.create_task(fetch_cluster())]
+    else:
+        tasks = [asyncio.create_task(stream_host(s)) for s in SERVERS]
+    tasks.append(asyncio.create_task(_ts_ticker()))
+    try:
         await asyncio.gather(*tasks)
-        
-        # 数据更新后，Live 上下文会自动调用 generate_dashboard 重绘
-        # 但我们需要手动 update 一次以防万一
-        live.update(generate_dashboard())
-        
-        await asyncio.sleep(REFRESH_RATE)
+    finally:
+        for t in tasks:
+            t.cancel()
+        close_all()
+        if _HTTP_SESSION is not None:
+            await _HTTP_SESSION.close()
 
-def main():
-    if not shutil.which("ssh"):
-        print("Error: ssh command not found.")
-        return
+async def _drain():
+    """等事件循环里其余任务（被取消的 run 及其子任务）收尾"""
+    others = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    await asyncio.gather(*others, return_exceptions=True)
+
+def render_loop(live, fetching):
+    """
+    主线程只负责渲染：有服务器显示内容变化就立即重绘；没有变化时也每 REFRESH_RATE 秒重绘一次，
+    让数据不变的服务器的更新时间和终端尺寸变化也能显示出来（面板有缓存，这种重绘很便宜）。
+    渲染再慢也不会拖住另一个线程里的 SSH 读取。
+    """
+    while not fetching.done():
+        _STATE_CHANGED.wait(timeout=REFRESH_RATE)
+        _STATE_CHANGED.clear()
+        live.update(generate_dashboard(), refresh=True)
+        time.sleep(RENDER_INTERVAL)
+    fetching.result()
 
+def main():
+    _init_grid()
+    _compile_dashboard()
     layout = generate_dashboard()
-    
-    # 启动 Live 渲染
-    with Live(layout, refresh_per_second=4, screen=True) as live:
+
+    # 事件循环（所有 SSH/HTTP 抓取）放在后台线程，Rich 渲染留在主线程
+    loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+    worker = threading.Thread(target=loop.run_forever, daemon=True)
+    worker.start()
+    fetching = asyncio.run_coroutine_threadsafe(run(), loop)
+
+    # 启动 Live 渲染：不开定时刷新，由 render_loop 在数据变化时或每 REFRESH_RATE 秒刷新
+    with Live(layout, auto_refresh=False, screen=True) as live:
         try:
-            asyncio.run(update_loop(live))
+            render_loop(live, fetching)
         except KeyboardInterrupt:
             pass
+        finally:
+            # 取消抓取，等连接关闭后再停掉事件循环
+            fetching.cancel()
+            try:
+                asyncio.run_coroutine_threadsafe(_drain(), loop).result(timeout=5)
+            except Exception:
+                pass
+            loop.call_soon_threadsafe(loop.stop)
+            worker.join(timeout=1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
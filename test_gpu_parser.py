@@ -0,0 +1,38 @@
+import random
+
+import numpy as np
+
+import gpu_parser
+
+
+def _both(raw):
+    a = gpu_parser.alloc_buffers()
+    b = gpu_parser.alloc_buffers()
+    n_scan = gpu_parser._scan_csv(np.frombuffer(raw, dtype=np.uint8), *a)
+    n_split = gpu_parser._split_csv(raw, *b)
+    return [col[:n_scan].tolist() for col in a], [col[:n_split].tolist() for col in b]
+
+
+def test_scan_and_split_agree_on_edge_cases():
+    cases = [
+        b"0, 37, 1234, 81559, 45\n1, 0, 0, 24576, 30\n",
+        b"0, 1 2, 3,4,5",
+        b"0, +1, 2, 3, 4",
+        b"0, 1_0, 2, 3, 4",
+        b"0, -1, 2, 3, 4",
+        b"0, [N/A], 2, 3, 4\n\n1, 2, 3, 4, 5\r\n",
+        b"0, 99999999999, 2, 3, 4\n1, 5, 6, 7, 8",
+        b"0,1,2,3,4,\n0,1,2,3\n",
+    ]
+    for raw in cases:
+        scan, split = _both(raw)
+        assert scan == split, raw
+
+
+def test_scan_and_split_agree_on_random_input():
+    rng = random.Random(0)
+    alphabet = b"0123456789, \t\r\n+-_x"
+    for _ in range(2000):
+        raw = bytes(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        scan, split = _both(raw)
+        assert scan == split, raw
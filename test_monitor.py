@@ -0,0 +1,25 @@
+import monitor
+
+
+def test_parse_dcgm_skips_non_finite_and_oversized_values():
+    text = "\n".join([
+        'DCGM_FI_DEV_GPU_UTIL{gpu="0"} 37',
+        'DCGM_FI_DEV_FB_USED{gpu="0"} 10',
+        'DCGM_FI_DEV_FB_FREE{gpu="0"} 90',
+        'DCGM_FI_DEV_GPU_TEMP{gpu="0"} NaN',
+        'DCGM_FI_DEV_GPU_UTIL{gpu="1"} +Inf',
+        'DCGM_FI_DEV_GPU_TEMP{gpu="1"} -Inf',
+        'DCGM_FI_DEV_FB_USED{gpu="1"} 1e12',
+        'DCGM_FI_DEV_FB_FREE{gpu="1"} 2147483647',
+    ])
+    frame = monitor._parse_dcgm(text)
+    assert frame.ids.tolist() == [0, 1]
+    assert frame.util.tolist() == [37, 0]
+    assert frame.mem_used.tolist() == [10, 0]
+    assert frame.mem_total.tolist() == [100, 2147483647]
+    assert frame.temp.tolist() == [0, 0]
+
+
+def test_parse_dcgm_all_bad_values_is_empty():
+    frame = monitor._parse_dcgm('DCGM_FI_DEV_GPU_UTIL{gpu="0"} NaN\n')
+    assert frame is monitor.EMPTY_FRAME